@@ -12,6 +12,9 @@ setup(
         "pandas",
         "setuptools >= 61.0"
     ],
+    extras_require={
+        "storage": ["google-cloud-bigquery-storage >= 2.42"]
+    },
     classifiers=[
         "Programming Language :: Python :: 3"
     ]
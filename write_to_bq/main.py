@@ -1,7 +1,330 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import importlib.metadata
+import importlib.util
+import io
+import itertools
+import logging
+import math
+import time
+from typing import Literal, Optional, Union
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-def writeDfToBq(data:pd.DataFrame, project_id:str, dataset_id:str, table_id:str, job_id_prefix:str) -> bigquery.LoadJob:
+logger = logging.getLogger(__name__)
+
+_MAX_LOAD_PARTS = 8 # upper bound of parallel load jobs per write, to spare the daily load job quota
+_STORAGE_WRITE_AUTO_ROWS = 10_000 # rows below which writeDfToBq can pick the Storage Write API by itself
+_STORAGE_WRITE_MAX_ROWS = 50_000 # rows above which writeDfToBq always uses load jobs
+_STORAGE_WRITE_BATCH_ROWS = 500 # rows per AppendRows request
+_STORAGE_WRITE_MIN_VERSION = (2, 42) # first google-cloud-bigquery-storage release known to append Arrow rows
+_PARTITION_TYPES = ("DATE", "DATETIME", "TIMESTAMP", "INTEGER", "INT64") # partition column types the MERGE can prune on
+_SCHEMA_TTL = 60 # seconds cached table metadata is considered fresh
+_MISSING_TABLE = object() # cache sentinel for tables that do not exist
+_table_cache = {} # fully qualified table id -> (table or sentinel, fetch time)
+
+def _load_job_template(write_disposition:str) -> bigquery.LoadJobConfig:
+    """Builds the Parquet load job configuration used by every write, for the given write disposition."""
+    parquet_options = bigquery.ParquetOptions()
+    parquet_options.enable_list_inference = True # read Parquet lists as REPEATED fields
+    return bigquery.LoadJobConfig(
+        source_format = bigquery.SourceFormat.PARQUET,
+        create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED,
+        write_disposition = write_disposition,
+        parquet_options = parquet_options
+    )
+
+@lru_cache(maxsize=None)
+def _get_client(project_id:str, location:str=None) -> bigquery.Client:
+    """Returns a BigQuery client for the given project and default job location, shared by every call in the process."""
+    return bigquery.Client(project=project_id, location=location)
+
+@lru_cache(maxsize=None)
+def _get_write_client():
+    """Returns a Storage Write API client, shared by every call in the process. Needs `google-cloud-bigquery-storage`."""
+    from google.cloud import bigquery_storage_v1
+    return bigquery_storage_v1.BigQueryWriteClient()
+
+@lru_cache(maxsize=None)
+def _storage_write_available() -> bool:
+    """Tells whether the optional `google-cloud-bigquery-storage` package is installed in a version able to append Arrow rows."""
+    if importlib.util.find_spec("google.cloud.bigquery_storage_v1") is None:
+        return False
+    try:
+        version = importlib.metadata.version("google-cloud-bigquery-storage")
+        return tuple(int(part) for part in version.split(".")[:2]) >= _STORAGE_WRITE_MIN_VERSION
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return False
+
+def _get_table(client:bigquery.Client, fq_table:str, ttl:float=_SCHEMA_TTL) -> bigquery.Table:
+    """
+    Returns the metadata of a BigQuery table, memoized for `ttl` seconds.
+
+    Missing tables are cached too, so repeated lookups of a table that does not exist
+    do not hit the API again until the entry expires.
+
+    Args:
+        client (bigquery.Client): The client used to fetch the table metadata.
+        fq_table (str): The fully qualified table id (`project.dataset.table`).
+        ttl (float, optional): Seconds a cached entry is reused. Defaults to 60.
+
+    Returns:
+        bigquery.Table: The table as returned by `get_table`. Its `schema` property builds a new list on every access.
+
+    Raises:
+        NotFound: If the table does not exist.
+    """
+    cached = _table_cache.get(fq_table)
+    if cached is None or time.monotonic() - cached[1] >= ttl:
+        try:
+            resolved_table = client.get_table(fq_table)
+        except NotFound:
+            resolved_table = _MISSING_TABLE
+        cached = (resolved_table, time.monotonic())
+        _table_cache[fq_table] = cached
+
+    if cached[0] is _MISSING_TABLE:
+        raise NotFound(f"Table {fq_table} not found.")
+    return cached[0]
+
+_BQ_TO_ARROW_TYPES = {
+    "STRING": pa.string,
+    "GEOGRAPHY": pa.string,
+    "JSON": pa.string,
+    "BYTES": pa.binary,
+    "INTEGER": pa.int64,
+    "INT64": pa.int64,
+    "FLOAT": pa.float64,
+    "FLOAT64": pa.float64,
+    "NUMERIC": lambda: pa.decimal128(38, 9),
+    "BIGNUMERIC": lambda: pa.decimal256(76, 38),
+    "BOOLEAN": pa.bool_,
+    "BOOL": pa.bool_,
+    "TIMESTAMP": lambda: pa.timestamp("us", tz="UTC"),
+    "DATETIME": lambda: pa.timestamp("us"),
+    "DATE": pa.date32,
+    "TIME": lambda: pa.time64("us"),
+}
+
+def _bq_field_to_arrow(field:bigquery.SchemaField) -> pa.Field:
+    """Maps a BigQuery schema field to a pyarrow field, or returns None if its type has no known mapping."""
+    if field.field_type in ("RECORD", "STRUCT"):
+        subfields = [_bq_field_to_arrow(subfield) for subfield in field.fields]
+        if any(subfield is None for subfield in subfields):
+            return None
+        arrow_type = pa.struct(subfields)
+    elif field.field_type in _BQ_TO_ARROW_TYPES:
+        arrow_type = _BQ_TO_ARROW_TYPES[field.field_type]()
+    else:
+        return None
+
+    if field.mode == "REPEATED":
+        arrow_type = pa.list_(arrow_type)
+    return pa.field(field.name, arrow_type)
+
+def _bq_schema_to_arrow(bq_schema:list) -> pa.Schema:
+    """
+    Builds the pyarrow schema matching a BigQuery table schema.
+
+    Converting a DataFrame with an explicit schema lets pyarrow cast every column straight to its
+    BigQuery type instead of inferring it, which is costly for object, datetime and decimal columns.
+
+    Args:
+        bq_schema (list): The BigQuery schema (list of `bigquery.SchemaField`).
+
+    Returns:
+        pa.Schema: The equivalent pyarrow schema, or None if any field has a type without a known mapping.
+    """
+    arrow_fields = [_bq_field_to_arrow(field) for field in bq_schema]
+    if any(arrow_field is None for arrow_field in arrow_fields):
+        return None
+    return pa.schema(arrow_fields)
+
+def _ts() -> str:
+    """Returns the current UTC time formatted as the suffix appended to job IDs."""
+    return time.strftime('%Y%m%d%H%M%S', time.gmtime())
+
+def _coerce_df_to_bq_schema(df:pd.DataFrame, bq_schema:list) -> pd.DataFrame:
+    """
+    Casts the object columns of a DataFrame to the dtypes matching their BigQuery fields.
+
+    pyarrow has to inspect every value of an object column to convert it. Casting STRING, TIMESTAMP and INTEGER
+    columns with vectorized pandas conversions first avoids that. REPEATED fields, columns that already have a
+    specific dtype and STRING columns holding anything other than text are left as they are.
+
+    Args:
+        df (pd.DataFrame): The pandas DataFrame to cast. It is not modified.
+        bq_schema (list): The BigQuery schema (list of `bigquery.SchemaField`) of the columns being written.
+
+    Returns:
+        pd.DataFrame: A shallow copy of `df` with the cast columns, or `df` itself when no column needed casting.
+    """
+    converted = {}
+    for field in bq_schema:
+        if field.mode == "REPEATED" or df[field.name].dtype != object:
+            continue
+        if field.field_type == "STRING":
+            # Only columns already holding text: anything else is left to pyarrow, so bad values still fail
+            if pd.api.types.infer_dtype(df[field.name], skipna=True) == "string":
+                converted[field.name] = df[field.name].astype("string[pyarrow]")
+        elif field.field_type == "TIMESTAMP":
+            converted[field.name] = pd.to_datetime(df[field.name], utc=True)
+        elif field.field_type in ("INTEGER", "INT64"):
+            # Cast directly: going through float64 would round values above 2**53, and strings are still rejected
+            converted[field.name] = df[field.name].astype("Int64")
+
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for col, values in converted.items():
+        df[col] = values
+    return df
+
+def _to_parquet(data:pd.DataFrame, arrow_schema:pa.Schema=None, columns:list=None) -> io.BytesIO:
+    """
+    Serializes a pandas DataFrame into an in-memory Parquet file ready to be sent with `load_table_from_file`.
+
+    The file is SNAPPY-compressed, uses the compliant list layout BigQuery expects for REPEATED fields
+    and stores timestamps with microsecond precision, which is the finest BigQuery supports.
+
+    Args:
+        data (pd.DataFrame): The pandas DataFrame to serialize. The index is not written.
+        arrow_schema (pa.Schema, optional): The schema to convert the DataFrame to. Only its columns are written.
+            Defaults to the types inferred by pyarrow.
+        columns (list, optional): The columns to write, in order. They are picked by pyarrow without copying the DataFrame.
+            Ignored when `arrow_schema` is given, as the schema already selects the columns. Defaults to all the columns of `data`.
+
+    Returns:
+        io.BytesIO: The Parquet file, rewound to its first byte.
+    """
+    if arrow_schema is not None:
+        columns = None # pyarrow does not accept both
+    arrow_table = pa.Table.from_pandas(data, schema=arrow_schema, columns=columns, preserve_index=False)
+    buffer = io.BytesIO()
+    pq.write_table(
+        arrow_table,
+        buffer,
+        compression = 'snappy',
+        use_dictionary = True,
+        use_compliant_nested_type = True,
+        coerce_timestamps = 'us',
+        allow_truncated_timestamps = True
+    )
+    buffer.seek(0)
+    return buffer
+
+def _load_parquet(client:bigquery.Client, data:pd.DataFrame, arrow_schema:pa.Schema, destination:bigquery.Table, job_id:str, job_config:bigquery.LoadJobConfig, columns:list=None) -> bigquery.LoadJob:
+    """Serializes a DataFrame to Parquet and submits it as a load job into `destination`."""
+    return client.load_table_from_file(
+        file_obj = _to_parquet(data, arrow_schema, columns),
+        destination = destination,
+        job_id = job_id,
+        job_config = job_config,
+        project = client.project
+    )
+
+def _append_rows(project_id:str, dataset_id:str, table_id:str, data:pd.DataFrame, arrow_schema:pa.Schema) -> list:
+    """
+    Appends a pandas DataFrame to an existing BigQuery table through the default stream of the Storage Write API.
+
+    The rows are sent as Arrow record batches of 500 rows over a single connection. Each batch is committed
+    as soon as BigQuery acknowledges it, so a failure may leave the preceding batches written.
+
+    Args:
+        project_id (str): The ID of the BigQuery project.
+        dataset_id (str): The ID of the BigQuery dataset.
+        table_id (str): The ID of the BigQuery table.
+        data (pd.DataFrame): The pandas DataFrame to append.
+        arrow_schema (pa.Schema): The Arrow schema matching the table columns being written.
+
+    Returns:
+        list: The `AppendRowsResponse` of every batch, in row order.
+    """
+    from google.cloud.bigquery_storage_v1 import types, writer
+
+    write_client = _get_write_client()
+    request_template = types.AppendRowsRequest()
+    request_template.write_stream = f"{write_client.table_path(project_id, dataset_id, table_id)}/streams/_default"
+    arrow_data = types.AppendRowsRequest.ArrowData()
+    arrow_data.writer_schema = types.ArrowSchema(serialized_schema=arrow_schema.serialize().to_pybytes())
+    request_template.arrow_rows = arrow_data
+    append_rows_stream = writer.AppendRowsStream(write_client, request_template)
+
+    arrow_table = pa.Table.from_pandas(data, schema=arrow_schema, preserve_index=False)
+    try:
+        futures = []
+        for batch in arrow_table.to_batches(max_chunksize=_STORAGE_WRITE_BATCH_ROWS):
+            arrow_data = types.AppendRowsRequest.ArrowData()
+            arrow_data.rows = types.ArrowRecordBatch(serialized_record_batch=batch.serialize().to_pybytes())
+            request = types.AppendRowsRequest()
+            request.arrow_rows = arrow_data
+            futures.append(append_rows_stream.send(request))
+        return [future.result() for future in futures]
+    finally:
+        append_rows_stream.close()
+
+def _partition_range(values:pd.Series, field_type:str, lookback_days:int=None) -> list:
+    """
+    Builds the query parameters bounding the partitions touched by a merge.
+
+    Args:
+        values (pd.Series): The partition column of the data being merged. It must not contain nulls.
+        field_type (str): The BigQuery type of the partition column, one of DATE, DATETIME, TIMESTAMP or INTEGER.
+        lookback_days (int, optional): Days the lower bound is moved back, for time-unit partitions. Defaults to None.
+
+    Returns:
+        list: The `partition_lo` and `partition_hi` query parameters (bigquery.ScalarQueryParameter).
+    """
+    if field_type in ("INTEGER", "INT64"):
+        return [
+            bigquery.ScalarQueryParameter("partition_lo", "INT64", int(values.min())),
+            bigquery.ScalarQueryParameter("partition_hi", "INT64", int(values.max()))
+        ]
+
+    lo, hi = pd.Timestamp(values.min()), pd.Timestamp(values.max())
+    if lookback_days:
+        lo -= pd.Timedelta(days=lookback_days)
+    if field_type == "DATE":
+        # Arrow loads tz-aware values into a DATE column by their UTC date
+        lo, hi = [(bound if bound.tzinfo is None else bound.tz_convert("UTC")).date() for bound in (lo, hi)]
+    elif field_type == "TIMESTAMP":
+        lo, hi = [(bound.tz_localize("UTC") if bound.tzinfo is None else bound).to_pydatetime() for bound in (lo, hi)]
+    else:
+        # Arrow stores tz-aware values of DATETIME columns as their UTC wall time
+        lo, hi = [(bound if bound.tzinfo is None else bound.tz_convert("UTC").tz_localize(None)).to_pydatetime() for bound in (lo, hi)]
+    return [
+        bigquery.ScalarQueryParameter("partition_lo", field_type, lo),
+        bigquery.ScalarQueryParameter("partition_hi", field_type, hi)
+    ]
+
+def _partition_values(values:pd.Series, field_type:str) -> bigquery.ArrayQueryParameter:
+    """
+    Builds the query parameter listing the partitions replaced by an `insert_overwrite` merge.
+
+    Values of TIMESTAMP and DATETIME columns are reduced to their (UTC) date, as daily partitions are assumed.
+
+    Args:
+        values (pd.Series): The partition column of the data being written. It must not contain nulls.
+        field_type (str): The BigQuery type of the partition column, one of DATE, DATETIME, TIMESTAMP or INTEGER.
+
+    Returns:
+        bigquery.ArrayQueryParameter: The `partitions` query parameter.
+    """
+    if field_type in ("INTEGER", "INT64"):
+        return bigquery.ArrayQueryParameter("partitions", "INT64", [int(value) for value in values.unique()])
+
+    dates = set()
+    for value in values.unique():
+        value = pd.Timestamp(value)
+        if value.tzinfo is not None:
+            value = value.tz_convert("UTC")
+        dates.add(value.date())
+    return bigquery.ArrayQueryParameter("partitions", "DATE", sorted(dates))
+
+def writeDfToBq(data:pd.DataFrame, project_id:str, dataset_id:str, table_id:str, job_id_prefix:str, chunk_rows:Optional[int]=None, use_storage_write_api:Optional[bool]=False, location:Optional[str]=None) -> Union[bigquery.LoadJob, list]:
     """
     Writes a pandas DataFrame to a BigQuery table.
 
@@ -15,52 +338,102 @@ def writeDfToBq(data:pd.DataFrame, project_id:str, dataset_id:str, table_id:str,
         dataset_id (str): The ID of the BigQuery dataset.
         table_id (str): The ID of the BigQuery table.
         job_id_prefix (str): A prefix for the load job ID (timestamp will be appended).
+        chunk_rows (int, optional): Split the DataFrame into parts of `chunk_rows` rows, each serialized and uploaded
+            in parallel as its own load job. At most 8 parts are used, so the actual part size is the larger of
+            `chunk_rows` and an eighth of the DataFrame. Only applies to existing tables. Defaults to None, which never
+            splits the DataFrame.
+        use_storage_write_api (bool, optional): Append the rows through the Storage Write API instead of a load job,
+            which avoids the daily quota of table modifications. Requires `google-cloud-bigquery-storage>=2.42` and only
+            applies to existing tables whose schema maps to Arrow and DataFrames of up to 50,000 rows; otherwise a
+            load job is used. None selects it automatically for DataFrames under 10,000 rows when the package is
+            installed. Defaults to False.
+        location (str, optional): The location of the dataset (e.g. 'EU'), used for every job. Defaults to None, which lets
+            BigQuery resolve it.
 
     Returns:
-        bigquery.LoadJob: The created BigQuery load job object.
+        bigquery.LoadJob | list: The created BigQuery load job object. When `chunk_rows` is given and the DataFrame
+            is split, the list of load jobs (one per part, in row order). The parts are loaded independently, so a
+            failed part does not roll back the others. When the Storage Write API is used, the list of
+            `AppendRowsResponse` of every batch, which are already committed.
+
+    Raises:
+        Exception: If any part of a split DataFrame could not be submitted. The message lists the load jobs of the
+            parts that were submitted, which are not rolled back.
     """
 
     # BigQuery client and table reference
-    client = bigquery.Client(project=project_id)
-    table = bigquery.Table(f"{project_id}.{dataset_id}.{table_id}")
+    client = _get_client(project_id, location)
+    fq_table = f"{project_id}.{dataset_id}.{table_id}"
+    table = bigquery.Table(fq_table)
 
     # Load job configuration
-    job_config = bigquery.LoadJobConfig()
-    job_config.source_format = bigquery.SourceFormat.PARQUET
-    job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
-    job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+    job_config = _load_job_template(bigquery.WriteDisposition.WRITE_APPEND)
 
     # Schema handling (automatic or based on existing table)
     try:
         # Attempt to get the existing table schema
-        table_schema = client.get_table(table).schema
+        resolved_table = _get_table(client, fq_table)
+        table_schema = resolved_table.schema
         
-        # Remove fields from the schema that are not present in the DataFrame
-        fields_to_remove = [field for field in table_schema if field.name not in data.columns]
-        for field in fields_to_remove:
-            table_schema.remove(field)
+        # Keep only the schema fields present in the DataFrame
+        col_set = frozenset(data.columns)
+        table_schema = [field for field in table_schema if field.name in col_set]
         job_config.schema = table_schema
         job_config.autodetect = False # Use the provided schema
-    except:
+        logger.debug("Resolved schema: %s", table_schema)
+        data = _coerce_df_to_bq_schema(data, table_schema)
+        arrow_schema = _bq_schema_to_arrow(table_schema)
+        all_fields = [field.name for field in table_schema]
+        columns = None if list(data.columns) == all_fields else all_fields # only select when a subset/reorder is needed
+        table = resolved_table # already carries the resolved reference
+    except NotFound:
         job_config.autodetect = True
-        print('No se ha podido recuperar el esquema de la tabla. Es posible que la tabla no exista.')
+        arrow_schema = None
+        columns = None
+        _table_cache.pop(fq_table, None) # the load job may create the table
+        logger.info("Could not retrieve the schema of %s, it may not exist. Using schema autodetection.", fq_table)
     
-    # Create the load job
-    load_job = client.load_table_from_dataframe(
-        dataframe = data,
-        destination = table,
-        job_id = f"{job_id_prefix}_{pd.to_datetime('now').strftime('%Y%m%d%H%M%S')}",
-        job_config = job_config,
-        project = project_id
-    )
-    print(f"Load job creado con el siguiente id: {load_job.job_id}.")
-    return load_job
+    # Small appends to existing tables can skip load jobs altogether
+    if use_storage_write_api is None:
+        use_storage_write_api = len(data) < _STORAGE_WRITE_AUTO_ROWS and _storage_write_available()
+    if use_storage_write_api and arrow_schema is not None and len(data) <= _STORAGE_WRITE_MAX_ROWS:
+        responses = _append_rows(project_id, dataset_id, table_id, data, arrow_schema)
+        logger.info("%s rows written to %s through the Storage Write API in %s batches.", len(data), fq_table, len(responses))
+        return responses
+
+    job_id = f"{job_id_prefix}_{_ts()}"
+    n_parts = min(math.ceil(len(data) / chunk_rows), _MAX_LOAD_PARTS) if chunk_rows else 1
+
+    # Create the load job. Tables that may not exist yet are always created by a single job.
+    if job_config.autodetect or n_parts < 2:
+        load_job = _load_parquet(client, data, arrow_schema, table, job_id, job_config, columns)
+        logger.info("Load job created with id: %s", load_job.job_id)
+        return load_job
 
-def writeDfToBq_with_merging(data:pd.DataFrame, project_id:str, dataset_id:str, table_id:str, job_id_prefix:str, cols_to_check:list=[], cols_to_update:list=[]) -> tuple[bigquery.LoadJob]:
+    # The parts are serialized and uploaded in parallel, one load job per part
+    part_rows = math.ceil(len(data) / n_parts)
+    with ThreadPoolExecutor(max_workers=n_parts) as pool:
+        futures = [
+            pool.submit(_load_parquet, client, data.iloc[start:start + part_rows], arrow_schema, table, f"{job_id}_part{part}", job_config, columns)
+            for part, start in enumerate(range(0, len(data), part_rows))
+        ]
+        load_jobs, errors = [], []
+        for future in futures:
+            try:
+                load_jobs.append(future.result())
+            except Exception as e:
+                errors.append(e)
+    if errors:
+        raise Exception(f"No se han podido enviar {len(errors)} de {len(futures)} partes a {fq_table}: {errors}. Load jobs ya enviados (no se revierten): {[load_job.job_id for load_job in load_jobs]}")
+    logger.info("Load jobs created with ids: %s", [load_job.job_id for load_job in load_jobs])
+    return load_jobs
+
+def writeDfToBq_with_merging(data:pd.DataFrame, project_id:str, dataset_id:str, table_id:str, job_id_prefix:str, cols_to_check:Optional[list]=None, cols_to_update:Optional[list]=None, partition_col:Optional[str]=None, partition_lookback_days:Optional[int]=None, strategy:Literal['merge','insert_overwrite']='merge', location:Optional[str]=None) -> tuple[bigquery.LoadJob]:
     """Sends a pandas DataFrame to a BigQuery table, performing schema handling, data loading, and merging with the existing data.
 
     This function loads data from a pandas DataFrame into a temporary BigQuery table, merges the data with an existing target table,
-    and then deletes the temporary table after the merge. The schema is either detected automatically or based on the existing table schema.
+    and then deletes the temporary table after the merge, both in a single query job. The schema is taken from the existing target table.
+    If the target table does not exist yet, the data is loaded directly into it with an autodetected schema and no merge is performed.
 
     Args:
         data (pd.DataFrame): The pandas DataFrame containing the data to be loaded into BigQuery.
@@ -69,16 +442,35 @@ def writeDfToBq_with_merging(data:pd.DataFrame, project_id:str, dataset_id:str,
         table_id (str): The ID of the BigQuery table to merge the data into.
         job_id_prefix (str): A prefix for the job IDs to avoid conflicts between multiple jobs.
         cols_to_check (list, optional): A list of column names used to match records between the source and target tables. Defaults to columns with non-numeric types in `data`.
+            When several rows of `data` share the same non-null values in these columns, only the last one is merged.
         cols_to_update (list, optional): A list of column names to update in the target table if a match is found. Defaults to numeric columns in `data`.
+            Columns also present in `cols_to_check` are ignored.
+        partition_col (str, optional): The partition column of the target table (DATE, DATETIME, TIMESTAMP or INTEGER). When given,
+            the merge only looks at target rows whose value falls between the minimum and maximum of this column in `data`, which
+            lets BigQuery prune the other partitions. Matching rows outside that range are not updated and are inserted again instead,
+            so use it only when a record never moves across partitions. The column must not contain nulls. Defaults to None.
+        partition_lookback_days (int, optional): Days to extend the pruning range backwards from the minimum of `partition_col`,
+            for records whose existing copy may live in an older partition. Ignored for INTEGER partitions. Defaults to None.
+        strategy (str, optional): How the temp table is written into the target table. 'merge' runs a MERGE on `cols_to_check`.
+            'insert_overwrite' deletes every target row whose `partition_col` value (its date, for TIMESTAMP and DATETIME columns)
+            appears in `data` and inserts the temp table instead, in one transaction. That is cheaper than a MERGE but only correct
+            when `data` holds the complete content of those partitions. It requires `partition_col`, and ignores `cols_to_check`,
+            `cols_to_update` and the deduplication of match keys. Defaults to 'merge'.
+        location (str, optional): The location of the dataset (e.g. 'EU'), used for every job. Defaults to None, which lets
+            BigQuery resolve it.
 
     Returns:
         tuple: A tuple containing three job objects:
             - load_job (bigquery.LoadJob): The job that loads data into the temporary table.
-            - merge_job (bigquery.QueryJob): The job that performs the merge operation from the temporary table to the target table.
-            - delete_job (bigquery.QueryJob): The job that deletes the temporary table after the merge operation.
+            - merge_job (bigquery.QueryJob): The job that performs the merge (or partition replacement) from the temporary table to the target table.
+            - delete_job (bigquery.QueryJob): The job that deletes the temporary table after the merge operation. This is the same
+              job as `merge_job`, kept in the tuple for backwards compatibility.
+        When the target table does not exist, `merge_job` and `delete_job` are None and `load_job` writes directly into the target table.
 
     Raises:
-        Exception: If any errors occur during the load, merge, or delete operations, an exception is raised with details about the errors.
+        ValueError: If `strategy` is unknown or is 'insert_overwrite' without `partition_col`, or if `partition_col` is not a column of both
+            `data` and the target table, has an unsupported type or contains nulls.
+        Exception: If any errors occur during the load or merge operations, an exception is raised with details about the errors.
 
     Example:
         load_job, merge_job, delete_job = writeDfToBq_with_merging(
@@ -89,88 +481,166 @@ def writeDfToBq_with_merging(data:pd.DataFrame, project_id:str, dataset_id:str,
             job_id_prefix='job_123'
         )
     """
-    print("Creating the Bigquery client")
-    bq_client = bigquery.Client(project=project_id)
-    table = bigquery.Table(f"{project_id}.{dataset_id}.{table_id}")
-    temp_table = bigquery.Table(f"{project_id}.{dataset_id}.{table_id}_temptable")
-    job_config = bigquery.LoadJobConfig()
-    job_config.source_format = bigquery.SourceFormat.PARQUET
-    job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
-    job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE # if the table exists, overwrite it
+    logger.debug("Creating the BigQuery client")
+    bq_client = _get_client(project_id, location)
+    fq_table = f"{project_id}.{dataset_id}.{table_id}"
 
-    # Schema handling (automatic or based on existing table)
+    # The arguments are validated even when the target table does not exist yet
+    if strategy not in ('merge', 'insert_overwrite'):
+        raise ValueError(f"Estrategia desconocida: {strategy}. Debe ser 'merge' o 'insert_overwrite'.")
+    if strategy == 'insert_overwrite' and partition_col is None:
+        raise ValueError("La estrategia 'insert_overwrite' necesita una columna de partición (partition_col).")
+
+    # Schema handling (based on the existing table)
     try:
         # Attempt to get the existing production table schema
-        table_schema = bq_client.get_table(table).schema 
-        
-        # Remove fields from the schema that are not present in the DataFrame
-        fields_to_remove = [field for field in table_schema if field.name not in data.columns]
-        for field in fields_to_remove:
-            table_schema.remove(field)
-        job_config.schema = table_schema
-        job_config.autodetect = False # Use the provided schema
-    except:
-        job_config.autodetect = True
-        print('No se ha podido recuperar el esquema de la tabla. Es posible que la tabla no exista.')
+        table_schema = _get_table(bq_client, fq_table).schema
+        target_exists = True
+    except NotFound:
+        target_exists = False
 
-    # Create the load job
-    load_job = bq_client.load_table_from_dataframe(
-        dataframe = data,
-        destination = temp_table,
-        job_id = f"{job_id_prefix}_temptable_{pd.to_datetime('now').strftime('%Y%m%d%H%M%S')}",
-        job_config = job_config,
-        project = project_id
-    )
-    print(f"Load job creado con el siguiente id: {load_job.job_id}.")
+    if not target_exists:
+        # Nothing to merge into: a single load job creates the target table
+        logger.info("Target table %s does not exist. Loading directly without merging.", fq_table)
+        load_job = writeDfToBq(data, project_id, dataset_id, table_id, job_id_prefix, location=location)
+        try:
+            output = load_job.result()
+            logger.info("Load job %s executed. Output: %s", load_job.job_id, output)
+        except Exception as e:
+            raise Exception(f"Se han detectado {len(load_job.errors)} errores durante la ejecución de {load_job.job_id}:\n{[err for err in load_job.errors]}")
+        return load_job, None, None
 
-    # Loading data as a temp table
-    try:
-        output = load_job.result()
-        print(f"Load job {load_job.job_id} ejecutado. Output: {output}.")
-    except Exception as e:
-        raise Exception(f"Se han detectado {len(load_job.errors)} errores durante la ejecución de {load_job.job_id}:\n{[err for err in load_job.errors]}")
+    ts = _ts() # shared job ID suffix, so the jobs of one write are easy to correlate
+    temp_table = bigquery.Table(f"{project_id}.{dataset_id}.{table_id}_temptable")
+    job_config = _load_job_template(bigquery.WriteDisposition.WRITE_TRUNCATE) # if the temp table exists, overwrite it
+
+    # Keep only the schema fields present in the DataFrame
+    col_set = frozenset(data.columns)
+    table_schema = [field for field in table_schema if field.name in col_set]
+    job_config.schema = table_schema
+    job_config.autodetect = False # Use the provided schema
+    logger.debug("Resolved schema: %s", table_schema)
+    arrow_schema = _bq_schema_to_arrow(table_schema)
+    all_fields = [field.name for field in table_schema]
+    columns = None if list(data.columns) == all_fields else all_fields # only select when a subset/reorder is needed
+
+    # The partition column is validated before loading anything into the temp table
+    query_parameters = []
+    if partition_col is not None:
+        partition_type = next((field.field_type for field in table_schema if field.name == partition_col), None)
+        if partition_type not in _PARTITION_TYPES:
+            raise ValueError(f"La columna de partición {partition_col} debe existir en los datos y en la tabla con uno de los tipos {_PARTITION_TYPES}.")
+        if data[partition_col].isna().any():
+            raise ValueError(f"La columna de partición {partition_col} contiene valores nulos.")
+        if strategy == 'insert_overwrite':
+            query_parameters = [_partition_values(data[partition_col], partition_type)]
+        else:
+            query_parameters = _partition_range(data[partition_col], partition_type, partition_lookback_days)
+
+    if strategy == 'merge':
+        # New Index objects are built, so the caller's lists are never modified
+        cols_to_check = pd.Index(cols_to_check) if cols_to_check is not None and len(cols_to_check) > 0 else data.select_dtypes(exclude='number').columns
+        cols_to_update = pd.Index(cols_to_update) if cols_to_update is not None and len(cols_to_update) > 0 else data.select_dtypes(include='number').columns
+        cols_to_update = cols_to_update.difference(cols_to_check, sort=False) # match keys are never updated nor inserted twice
+
+        # REPEATED fields have no equality operator in BigQuery, so they are matched by their JSON representation.
+        # They are read from the schema sent with the load job instead of fetching the temp table metadata.
+        repeated_fields = {field.name for field in job_config.schema if field.mode == "REPEATED"}
 
-    # Merging the temp table into the target table
-    cols_to_check = cols_to_check if len(cols_to_check) > 0 else data.select_dtypes(exclude=['float','int']).columns
-    cols_to_update = cols_to_update if len(cols_to_update) > 0 else data.select_dtypes(include=['float','int']).columns
+        # A MERGE fails when several source rows match the same target row, but only once the temp table is loaded.
+        # Rows with duplicated match keys are dropped beforehand, keeping the last one. Lists and dicts cannot be
+        # hashed, so match keys with REPEATED or RECORD fields are left as they are. Rows with a NULL key never
+        # match in the MERGE and are all inserted, so they are kept too.
+        unhashable_fields = repeated_fields | {field.name for field in job_config.schema if field.field_type in ("RECORD", "STRUCT")}
+        if len(cols_to_check) > 0 and not unhashable_fields.intersection(cols_to_check):
+            duplicated = data.duplicated(subset=cols_to_check, keep='last') & data[cols_to_check].notna().all(axis=1)
+            if duplicated.any():
+                logger.warning("Dropping %s rows with duplicated keys in %s.", duplicated.sum(), list(cols_to_check))
+                data = data[~duplicated]
 
+    # Cast only after the default match and update columns are chosen from the caller's dtypes,
+    # so an object column cast to Int64 is still a match key
+    data = _coerce_df_to_bq_schema(data, table_schema)
+
+    # Create the load job
+    load_job = _load_parquet(bq_client, data, arrow_schema, temp_table, f"{job_id_prefix}_temptable_{ts}", job_config, columns)
+    logger.info("Load job created with id: %s", load_job.job_id)
+
+    # The write script is built while the load job runs; everything it needs is already known locally
     NL = '\n' # new line for f-strings
-    merge_query = f"""
-    BEGIN
-        BEGIN TRANSACTION;
-            MERGE INTO `{project_id}.{dataset_id}.{table_id}` AS target
+    if strategy == 'insert_overwrite':
+        # Replacing whole partitions: the DELETE of a partition is free, unlike the target scan of a MERGE
+        all_columns = ', '.join(f'`{col}`' for col in all_fields)
+        partition_expr = f'`{partition_col}`' if partition_type in ("DATE", "INTEGER", "INT64") else f'DATE(`{partition_col}`)'
+        write_statement = f"""DELETE FROM `{project_id}.{dataset_id}.{table_id}`
+            WHERE {partition_expr} IN UNNEST(@partitions);
+
+            INSERT INTO `{project_id}.{dataset_id}.{table_id}` ({all_columns})
+            SELECT {all_columns} FROM `{project_id}.{dataset_id}.{table_id}_temptable`;"""
+    else:
+        # Merging the temp table into the target table. Column identifiers are quoted once,
+        # so reserved words can be used as column names
+        quoted = {col: f'`{col}`' for col in itertools.chain(cols_to_check, cols_to_update)}
+        on_clause = f'{NL}AND '.join(
+            f'TO_JSON_STRING(target.{quoted[to_check]}) = TO_JSON_STRING(source.{quoted[to_check]})' if to_check in repeated_fields
+            else f'target.{quoted[to_check]} = source.{quoted[to_check]}'
+            for to_check in cols_to_check
+        )
+        if partition_col is not None:
+            # Target rows outside the partitions present in the data are pruned from the scan
+            on_clause += f'{NL}AND target.`{partition_col}` BETWEEN @partition_lo AND @partition_hi'
+        update_clause = f',{NL}'.join(f'target.{quoted[to_update]} = source.{quoted[to_update]}' for to_update in cols_to_update)
+        insert_columns = ', '.join(quoted.values())
+        insert_values = ', '.join(f'source.{col}' for col in quoted.values())
+
+        write_statement = f"""MERGE INTO `{project_id}.{dataset_id}.{table_id}` AS target
             USING `{project_id}.{dataset_id}.{table_id}_temptable` AS source
-            ON {f'{NL}AND '.join([f'target.{to_check} = source.{to_check}' for to_check in cols_to_check])}
+            ON {on_clause}
             WHEN MATCHED THEN
             UPDATE SET
-                {f',{NL}'.join([f'target.{to_update} = source.{to_update}' for to_update in cols_to_update])}
+                {update_clause}
             WHEN NOT MATCHED THEN
-                INSERT ({', '.join([*cols_to_check,*cols_to_update])})
-                VALUES ({', '.join([f'source.{element}' for element in [*cols_to_check,*cols_to_update]])});
+                INSERT ({insert_columns})
+                VALUES ({insert_values});"""
+
+    # The temp table is written into the target table and dropped in a single script job. It is given
+    # an expiration first, so it cleans itself up if the script fails before reaching the DROP. Only the
+    # transaction is wrapped by the exception handler, so its ROLLBACK always has a transaction to undo.
+    merge_query = f"""
+    ALTER TABLE `{project_id}.{dataset_id}.{table_id}_temptable`
+    SET OPTIONS (expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 6 HOUR));
+
+    BEGIN
+        BEGIN TRANSACTION;
+            {write_statement}
 
         COMMIT TRANSACTION;
         
         EXCEPTION WHEN ERROR THEN
             SELECT @@error.message;
             ROLLBACK TRANSACTION;
-    END;"""
+    END;
+
+    DROP TABLE `{project_id}.{dataset_id}.{table_id}_temptable`;"""
     
-    merge_job = bq_client.query(query=merge_query, job_id=f"{job_id_prefix}_merge_data_{pd.to_datetime('now').strftime('%Y%m%d%H%M%S')}")
+    # Loading data as a temp table
     try:
-        merge_output = merge_job.result()
-        print(f"Merge job {merge_job.job_id} executed. Output: {merge_output}.")
+        output = load_job.result()
+        logger.info("Load job %s executed. Output: %s", load_job.job_id, output)
     except Exception as e:
-        raise Exception(f"Se han detectado {len(merge_job.errors)} errores durante la ejecución de {merge_job.job_id}:\n{[err for err in merge_job.errors]}")
-    
-    # Delete the temptable after a correct merging
-    delete_job = bq_client.query(
-        query=f"DROP TABLE `{project_id}.{dataset_id}.{table_id}_temptable`;",
-        job_id=f"{job_id_prefix}_delete_temp_data_{pd.to_datetime('now').strftime('%Y%m%d%H%M%S')}"
+        raise Exception(f"Se han detectado {len(load_job.errors)} errores durante la ejecución de {load_job.job_id}:\n{[err for err in load_job.errors]}")
+
+    merge_job = bq_client.query(
+        query=merge_query,
+        job_id=f"{job_id_prefix}_merge_data_{ts}",
+        job_config=bigquery.QueryJobConfig(query_parameters=query_parameters),
+        job_retry=None # fail fast instead of re-running the whole script
     )
     try:
-        delete_output = delete_job.result()
-        print(f"Merge job {delete_job.job_id} executed. Output: {delete_output}.")
+        merge_output = merge_job.result()
+        logger.info("Merge job %s executed. Output: %s", merge_job.job_id, merge_output)
     except Exception as e:
-        raise Exception(f"Se han detectado {len(delete_job.errors)} errores durante la ejecución de {delete_job.job_id}:\n{[err for err in delete_job.errors]}")
+        raise Exception(f"Se han detectado {len(merge_job.errors)} errores durante la ejecución de {merge_job.job_id}:\n{[err for err in merge_job.errors]}")
     
-    return load_job, merge_job, delete_job
+    # The same script job merged the data and dropped the temp table
+    return load_job, merge_job, merge_job